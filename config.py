@@ -1,5 +1,6 @@
 import os
 import yaml
+from functools import cached_property
 from pathlib import Path
 from dotenv import load_dotenv
 from utils.logger import log
@@ -9,7 +10,7 @@ class Config:
         # --- 默认配置 ---
         self.defaults = {
             'download': {
-                'concurrency': 16,
+                'concurrency': 64,
                 'display_concurrency': 5,
                 'retries': 3
             },
@@ -31,6 +32,8 @@ class Config:
         
         self.unzip_path = Path.cwd() / "instance"
         self.DEEARTH_CACHE_PATH = self.unzip_path / ".deearth_cache.json"
+        self.LIBRARY_CACHE_DIR = self.unzip_path / ".library_cache"
+        self.JAVA_CHECK_MARKER = self.unzip_path / ".java_checked"
 
     def _load_from_file(self):
         config_path = Path.cwd() / "config.yaml"
@@ -49,23 +52,23 @@ class Config:
             except Exception as e:
                 log.error(f"加载 config.yaml 失败: {e}")
 
-    @property
+    @cached_property
     def download_concurrency(self):
         return self.settings['download']['concurrency']
 
-    @property
+    @cached_property
     def display_concurrency(self):
         return self.settings['download']['display_concurrency']
 
-    @property
+    @cached_property
     def download_retries(self):
         return self.settings['download']['retries']
         
-    @property
+    @cached_property
     def deearth_concurrency(self):
         return self.settings['deearth']['concurrency']
         
-    @property
+    @cached_property
     def java_memory(self):
         return self.settings['installer']['java_memory']
 
@@ -1,20 +1,32 @@
+import json
+from functools import lru_cache
+from pathlib import Path
+
 from config import config
 
+# API URLs
+CF_MIRROR_URL = "https://mod.mcimirror.top"
+MR_MIRROR_URL = "https://mod.mcimirror.top"
+BMCLAPI_URL = "https://bmclapi2.bangbang93.com"
+BMCLAPI_MAVEN_URL = f"{BMCLAPI_URL}/maven"
+DEEARTH_API_URL = "https://dearth.0771010.xyz/api"
+
 # --- 动态 URL 函数 ---
+# 结果依赖 config.use_mirror，修改该选项后需调用 reset_api_urls()
+@lru_cache(maxsize=None)
 def get_cf_api_url():
     return f"{CF_MIRROR_URL}/curseforge" if config.use_mirror else "https://api.curseforge.com"
 
+@lru_cache(maxsize=None)
 def get_mr_api_url():
     return f"{MR_MIRROR_URL}/modrinth" if config.use_mirror else "https://api.modrinth.com"
 
-# API URLs
-CF_MIRROR_URL = "https://mod.mcimirror.top"
-MR_MIRROR_URL = "https://mod.mcimirror.top"
-BMCLAPI_URL = "https://bmclapi2.bangbang93.com"
-DEEARTH_API_URL = "https://dearth.0771010.xyz/api"
+def reset_api_urls():
+    get_cf_api_url.cache_clear()
+    get_mr_api_url.cache_clear()
 
-# 已知是通用模组，防止被误识别
-KNOWN_UNIVERSAL_MODS = {"geckolib", "supplementaries"}
+# 已知运行端的模组 (mod_id -> CLIENT/UNIVERSAL/SERVER)，命中时无需联网查询，也可防止通用模组被误识别
+KNOWN_MOD_SIDES = json.loads((Path(__file__).parent / "known_sides.json").read_text(encoding='utf-8'))
 
 # 文件名
 MANIFEST_JSON = "manifest.json"
@@ -1,192 +1,433 @@
 import asyncio
+import errno
 import hashlib
 import json
+import mmap
+import os
 import shutil
+import ssl
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Optional
-
-import mmh3
-import tomli
-from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from utils.logger import log, console
-from downloader import async_client
+from utils.json_utils import json_loads, json_dumps
+from downloader import get_async_client
 from config import config  # 修正导入
-from constants import KNOWN_UNIVERSAL_MODS, get_mr_api_url, get_cf_api_url, DEEARTH_API_URL
+from constants import KNOWN_MOD_SIDES, get_mr_api_url, get_cf_api_url, DEEARTH_API_URL
+
+# 哈希计算与 jar 解析都是阻塞操作，放到线程池中执行以免卡住事件循环
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count())
 
 def load_deearth_cache():
     if config.DEEARTH_CACHE_PATH.exists(): # 修正访问方式
         try:
-            return json.loads(config.DEEARTH_CACHE_PATH.read_text())
+            return json_loads(config.DEEARTH_CACHE_PATH.read_bytes())
         except json.JSONDecodeError:
             return {}
     return {}
 
 def save_deearth_cache(cache: Dict):
-    config.DEEARTH_CACHE_PATH.write_text(json.dumps(cache, indent=2)) # 修正访问方式
+    # 先写临时文件再替换，避免写入中途被中断导致缓存损坏
+    tmp_path = config.DEEARTH_CACHE_PATH.with_suffix('.tmp')
+    tmp_path.write_bytes(json_dumps(cache, indent=True))
+    os.replace(tmp_path, config.DEEARTH_CACHE_PATH)
+
+@lru_cache(maxsize=None)
+def _get_toml_parser():
+    # 首次解析时才导入；Python 不会缓存失败的导入，借助 lru_cache 只探测一次
+    try:
+        import rtoml as toml_parser  # 可选依赖，Rust 实现的 TOML 解析器
+    except ImportError:
+        try:
+            import tomllib as toml_parser
+        except ImportError:
+            import tomli as toml_parser
+    return toml_parser
 
 def get_zip_info(mod_path: Path) -> Optional[Dict[str, Any]]:
     try:
         with zipfile.ZipFile(mod_path, 'r') as zf:
             info = {'modinfo': {'type': '', 'data': {}}}
-            for name in zf.namelist():
-                if name.endswith("mods.toml") or name.endswith("neoforge.mods.toml"):
-                    info['modinfo']['type'] = "forge"
-                    info['modinfo']['data'] = tomli.loads(zf.read(name).decode('utf-8'))
-                    return info
-                if name.endswith("fabric.mod.json"):
-                    info['modinfo']['type'] = "fabric"
-                    info['modinfo']['data'] = json.loads(zf.read(name).decode('utf-8'))
-                    return info
+            # 元数据文件位置固定，直接查中央目录索引，无需遍历全部条目
+            name_to_info = zf.NameToInfo
+            forge_info = name_to_info.get("META-INF/mods.toml") or name_to_info.get("META-INF/neoforge.mods.toml")
+            if forge_info:
+                info['modinfo']['type'] = "forge"
+                with zf.open(forge_info) as f:
+                    info['modinfo']['data'] = _get_toml_parser().loads(f.read().decode('utf-8'))
+                return info
+            fabric_info = name_to_info.get("fabric.mod.json")
+            if fabric_info:
+                info['modinfo']['type'] = "fabric"
+                with zf.open(fabric_info) as f:
+                    info['modinfo']['data'] = json_loads(f.read())
             return info
     except Exception:
         return None
 
-def _calculate_murmur2_hash(data: bytes) -> int:
-    normalized_data = bytes(filter(lambda b: b not in b'\r\n\t ', data))
-    return mmh3.hash(normalized_data, seed=1, signed=True)
+# Murmur2 指纹计算前需要剔除的空白字节
+MURMUR2_WHITESPACE = b'\r\n\t '
+FINGERPRINT_CHUNK_SIZE = 65536
 
-async def _check_modrinth(sha1: str) -> Optional[bool]:
+def _calculate_fingerprints(mod_path: Path) -> Tuple[str, int]:
+    """通过内存映射计算 SHA1 和 Murmur2 指纹"""
+    import mmh3
+    murmur2 = mmh3.mmh3_32(seed=1)
+    with mod_path.open('rb', buffering=0) as f:
+        if os.fstat(f.fileno()).st_size == 0:  # 空文件无法映射
+            return hashlib.sha1().hexdigest(), murmur2.sintdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # 整个映射一次性交给 OpenSSL（支持时走 SHA-NI 指令），数据不经过 Python 堆
+            sha1 = hashlib.sha1(mm).hexdigest()
+            # 增量哈希逐块处理去除空白后的数据，不再为整个 jar 分配规范化副本
+            for offset in range(0, len(mm), FINGERPRINT_CHUNK_SIZE):
+                murmur2.update(mm[offset:offset + FINGERPRINT_CHUNK_SIZE].translate(None, MURMUR2_WHITESPACE))
+    return sha1, murmur2.sintdigest()
+
+# 批量查询时单次请求携带的指纹数量
+API_BATCH_SIZE = 100
+
+def _chunked(items: List, size: int) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+async def _check_modrinth_chunk(sha1_list: List[str]) -> Dict[str, bool]:
     try:
-        response = await async_client.get(f"{get_mr_api_url()}/v2/version_file/{sha1}?algorithm=sha1")
-        if response.status_code == 200:
-            version_info = response.json()
-            project_id = version_info.get('project_id')
-            response = await async_client.get(f"{get_mr_api_url()}/v2/project/{project_id}")
-            project_info = response.json()
-            client = project_info.get('client_side')
-            server = project_info.get('server_side')
-            return client == 'required' and server != 'required'
+        response = await get_async_client().post(
+            f"{get_mr_api_url()}/v2/version_files",
+            json={"hashes": sha1_list, "algorithm": "sha1"}
+        )
+        if response.status_code != 200:
+            return {}
+        versions = json_loads(response.content)
+        project_ids = sorted({v.get('project_id') for v in versions.values() if v.get('project_id')})
+        if not project_ids:
+            return {}
+        response = await get_async_client().get(
+            f"{get_mr_api_url()}/v2/projects",
+            params={"ids": json.dumps(project_ids)}
+        )
+        if response.status_code != 200:
+            return {}
+        projects = {p.get('id'): p for p in json_loads(response.content)}
+        verdicts = {}
+        for sha1, version_info in versions.items():
+            project_info = projects.get(version_info.get('project_id'))
+            if project_info:
+                client = project_info.get('client_side')
+                server = project_info.get('server_side')
+                verdicts[sha1] = client == 'required' and server != 'required'
+        return verdicts
     except Exception:
-        pass
-    return None
+        return {}
+
+async def _check_modrinth_batch(sha1_list: List[str]) -> Dict[str, bool]:
+    """批量查询 Modrinth，返回 sha1 -> 是否为客户端模组"""
+    verdicts = {}
+    for result in await asyncio.gather(*[_check_modrinth_chunk(c) for c in _chunked(sha1_list, API_BATCH_SIZE)]):
+        verdicts.update(result)
+    return verdicts
 
-async def _check_curseforge(murmur2_hash: int):
+async def _check_curseforge_chunk(fingerprints: List[int]) -> Dict[int, Dict[str, Any]]:
     try:
-        response = await async_client.post(
+        response = await get_async_client().post(
             f"{get_cf_api_url()}/v1/fingerprints",
-            json={"fingerprints": [murmur2_hash]}
+            json={"fingerprints": fingerprints}
         )
-        if response.status_code == 200 and response.json()['data']['exactMatches']:
-            return response.json()['data']['exactMatches'][0]
+        if response.status_code == 200:
+            matches = json_loads(response.content)['data']['exactMatches']
+            return {match.get('file', {}).get('fileFingerprint'): match for match in matches}
     except Exception:
         pass
-    return None
+    return {}
+
+async def _check_curseforge_batch(fingerprints: List[int]) -> Dict[int, Dict[str, Any]]:
+    """批量查询 CurseForge，返回 murmur2 指纹 -> 匹配结果"""
+    matches = {}
+    for result in await asyncio.gather(*[_check_curseforge_chunk(c) for c in _chunked(fingerprints, API_BATCH_SIZE)]):
+        matches.update(result)
+    return matches
 
 async def _check_deearth_api(mod_id: str) -> Optional[bool]:
     if not mod_id:
         return None
     try:
-        response = await async_client.get(f"{DEEARTH_API_URL}/modid?modid={mod_id}")
+        response = await get_async_client().get(f"{DEEARTH_API_URL}/modid?modid={mod_id}")
         if response.status_code == 200:
-            data = response.json()
+            data = json_loads(response.content)
             return data.get('client') == 'required' and data.get('server') != 'required'
     except Exception:
         pass
     return None
 
-async def deearth(mod_path: Path, rubbish_path: Path, cache: Dict) -> Optional[str]:
+# 查询前等待连接预热的最长时间（秒）
+WARM_UP_TIMEOUT = 2.0
+
+async def _warm_up_connections():
+    """预先与各 API 主机建立连接，后续请求可直接复用"""
+    urls = [get_mr_api_url(), get_cf_api_url(), DEEARTH_API_URL]
+    await asyncio.gather(*[get_async_client().head(url) for url in urls], return_exceptions=True)
+
+def _get_fresh_cache_entry(cache: Dict, mod_name: str, st: os.stat_result) -> Optional[Dict[str, Any]]:
+    """仅当文件大小和修改时间均未变化时返回缓存条目"""
+    entry = cache.get(mod_name)
+    if isinstance(entry, dict) and entry.get('size') == st.st_size and entry.get('mtime_ns') == st.st_mtime_ns:
+        return entry
+    return None
+
+def _check_local_metadata(modinfo: Dict[str, Any], mod_id: str) -> Optional[bool]:
+    modinfo_data = modinfo['data']
+    if modinfo['type'] == 'forge' and modinfo_data.get('mods'):
+        deps = modinfo_data.get('dependencies', {}).get(mod_id, [])
+        for dep in deps:
+            if dep.get('modId') in ['minecraft', 'forge', 'neoforge'] and dep.get('side') == 'CLIENT':
+                return True
+    elif modinfo['type'] == 'fabric':
+        if modinfo_data.get('environment') == 'client':
+            return True
+    return None
+
+async def scan_mod(jar: os.DirEntry, cache: Dict) -> Dict[str, Any]:
+    """第一阶段：解析模组元数据并计算指纹，缓存命中时直接沿用缓存结论"""
+    mod_path = Path(jar.path)
     mod_name = mod_path.name
-    if mod_name in cache:
-        if cache[mod_name] == "CLIENT":
-            shutil.move(str(mod_path), str(rubbish_path / mod_name))
-            return mod_name
-        return None
+    try:
+        st = jar.stat()
+    except OSError as e:
+        # 扫描期间文件被删除或无法访问，只记为出错，不影响其余模组
+        log.error(f"处理模组 {mod_name} 时出错: {e}")
+        return {'path': mod_path, 'entry': {'status': "ERROR"}, 'mod_id': '', 'modinfo': None, 'dirty': False}
+    cached = _get_fresh_cache_entry(cache, mod_name, st)
+    if cached and cached.get('status'):
+        return {'path': mod_path, 'entry': cached, 'mod_id': '', 'modinfo': None, 'dirty': False}
+
+    entry = {'status': '', 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    cache[mod_name] = entry
+    # dirty 表示缓存条目被新建或改写，需要写回磁盘
+    record = {'path': mod_path, 'entry': entry, 'mod_id': '', 'modinfo': None, 'dirty': True}
 
     try:
-        mod_bytes = mod_path.read_bytes()
-        zip_info = get_zip_info(mod_path)
+        loop = asyncio.get_running_loop()
+        zip_info = await loop.run_in_executor(_HASH_POOL, get_zip_info, mod_path)
         
         mod_id = ''
-        modinfo_data = {}
         if zip_info and zip_info.get('modinfo', {}).get('type'):
+            record['modinfo'] = zip_info['modinfo']
             modinfo_data = zip_info['modinfo']['data']
             if zip_info['modinfo']['type'] == 'forge' and modinfo_data.get('mods'):
                 mod_id = modinfo_data['mods'][0].get('modId', '')
             elif zip_info['modinfo']['type'] == 'fabric':
                 mod_id = modinfo_data.get('id', '')
+        record['mod_id'] = mod_id
         
-        if mod_id in KNOWN_UNIVERSAL_MODS:
-            cache[mod_name] = "UNIVERSAL"
-            return None
+        known_side = KNOWN_MOD_SIDES.get(mod_id)
+        if known_side:
+            entry['status'] = "CLIENT" if known_side == "CLIENT" else "UNIVERSAL"
+            return record
 
-        sha1 = hashlib.sha1(mod_bytes).hexdigest()
-        murmur2_hash = _calculate_murmur2_hash(mod_bytes)
-        
-        results = await asyncio.gather(
-            _check_modrinth(sha1),
-            _check_deearth_api(mod_id),
-            _check_curseforge(murmur2_hash)
-        )
-        
-        is_client_side = None
-        
-        if results[0] is not None:
-            is_client_side = results[0]
-            log.debug(f"{mod_name}: Modrinth API 判定结果: {'客户端' if is_client_side else '通用'}")
-        elif results[1] is not None:
-            is_client_side = results[1]
-            log.debug(f"{mod_name}: DeEarth API 判定结果: {'客户端' if is_client_side else '通用'}")
-
-        if is_client_side is None and zip_info and zip_info.get('modinfo', {}).get('type'):
-            modinfo = zip_info['modinfo']
-            log.debug(f"{mod_name}: API 未命中，回退到本地元数据分析")
-            if modinfo['type'] == 'forge' and modinfo_data.get('mods'):
-                deps = modinfo_data.get('dependencies', {}).get(mod_id, [])
-                for dep in deps:
-                    if dep.get('modId') in ['minecraft', 'forge', 'neoforge'] and dep.get('side') == 'CLIENT':
-                        is_client_side = True
-                        break
-            elif modinfo['type'] == 'fabric':
-                if modinfo_data.get('environment') == 'client':
-                    is_client_side = True
-        
-        final_status = "UNKNOWN"
-        if is_client_side is True:
-            final_status = "CLIENT"
-            shutil.move(str(mod_path), str(rubbish_path / mod_name))
+        # 元数据已明确声明仅客户端时直接判定，无需计算指纹和联网查询
+        if record['modinfo'] and _check_local_metadata(record['modinfo'], mod_id):
+            log.debug(f"{mod_name}: 本地元数据声明为客户端模组")
+            entry['status'] = "CLIENT"
+            return record
+
+        # 缓存中已有该文件的指纹时无需重新读取计算
+        if cached and cached.get('sha1') and cached.get('murmur2') is not None:
+            entry['sha1'], entry['murmur2'] = cached['sha1'], cached['murmur2']
+        else:
+            entry['sha1'], entry['murmur2'] = await loop.run_in_executor(_HASH_POOL, _calculate_fingerprints, mod_path)
+
+    except Exception as e:
+        log.error(f"处理模组 {mod_name} 时出错: {e}")
+        entry['status'] = "ERROR"
+
+    return record
+
+def _move_to_rubbish(mod_path: Path, rubbish_path: Path):
+    target = rubbish_path / mod_path.name
+    try:
+        # 同一文件系统内直接重命名即可，仅跨设备时才需要复制
+        os.replace(mod_path, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(str(mod_path), str(target))
+
+def _check_deearth_api_once(mod_id: str, deearth_results: Dict[str, asyncio.Task]) -> asyncio.Task:
+    """同一 mod_id 只请求一次 DeEarth API，多个版本的 jar 共享同一结果"""
+    if mod_id not in deearth_results:
+        deearth_results[mod_id] = asyncio.ensure_future(_check_deearth_api(mod_id))
+    return deearth_results[mod_id]
+
+async def deearth(
+    record: Dict[str, Any],
+    rubbish_path: Path,
+    mr_verdicts: Dict[str, Optional[bool]],
+    cf_matches: Dict[int, Optional[Dict[str, Any]]],
+    deearth_results: Dict[str, asyncio.Task],
+) -> Optional[str]:
+    """第三阶段：根据批量查询结果判定模组类型，客户端模组移入回收目录"""
+    mod_path = record['path']
+    mod_name = mod_path.name
+    entry = record['entry']
+
+    try:
+        if not entry['status']:
+            mod_id = record['mod_id']
+            is_client_side = mr_verdicts.get(entry['sha1'])
+
+            if is_client_side is not None:
+                log.debug(f"{mod_name}: Modrinth API 判定结果: {'客户端' if is_client_side else '通用'}")
+            else:
+                is_client_side = await _check_deearth_api_once(mod_id, deearth_results)
+                if is_client_side is not None:
+                    log.debug(f"{mod_name}: DeEarth API 判定结果: {'客户端' if is_client_side else '通用'}")
+
+            cf_match = cf_matches.get(entry['murmur2'])
+            if cf_match:
+                log.debug(f"{mod_name}: CurseForge 指纹匹配文件 {cf_match.get('id')}")
+
+            final_status = "UNKNOWN"
+            if is_client_side is True:
+                final_status = "CLIENT"
+            elif is_client_side is False:
+                final_status = "UNIVERSAL"
+            entry['status'] = final_status
+            record['dirty'] = True
+
+        if entry['status'] == "CLIENT":
+            await asyncio.get_running_loop().run_in_executor(_HASH_POOL, _move_to_rubbish, mod_path, rubbish_path)
             return mod_name
-        elif is_client_side is False:
-            final_status = "UNIVERSAL"
-        
-        cache[mod_name] = final_status
 
     except Exception as e:
         log.error(f"处理模组 {mod_name} 时出错: {e}")
-        cache[mod_name] = "ERROR"
+        entry['status'] = "ERROR"
+        record['dirty'] = True
 
     return None
 
 
+async def _lookup_fingerprints(
+    records: List[Dict[str, Any]],
+    mr_verdicts: Dict[str, Optional[bool]],
+    cf_matches: Dict[int, Optional[Dict[str, Any]]],
+):
+    """批量查询一组模组的指纹，结果（含未命中）写入跨批次共享的字典，相同指纹不会重复查询"""
+    pending = [r for r in records if not r['entry']['status']]
+    sha1_list = list({r['entry']['sha1'] for r in pending} - mr_verdicts.keys())
+    fingerprints = list({r['entry']['murmur2'] for r in pending} - cf_matches.keys())
+    mr_task = asyncio.create_task(_check_modrinth_batch(sha1_list))
+    cf_task = asyncio.create_task(_check_curseforge_batch(fingerprints))
+    verdicts = await mr_task
+    for sha1 in sha1_list:
+        mr_verdicts[sha1] = verdicts.get(sha1)
+    if all(mr_verdicts.get(r['entry']['sha1']) is not None for r in pending):
+        # Modrinth 已给出全部结论，无需继续等待 CurseForge
+        cf_task.cancel()
+        await asyncio.gather(cf_task, return_exceptions=True)
+        return
+    matches = await cf_task
+    for fingerprint in fingerprints:
+        cf_matches[fingerprint] = matches.get(fingerprint)
+
+
 async def deearth_main(mods_path: Path, rubbish_path: Path):
+    from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn
+
     log.info("开始筛选客户端模组...")
+    log.debug(f"指纹计算后端: {ssl.OPENSSL_VERSION}")
     mods_path.mkdir(exist_ok=True)
     rubbish_path.mkdir(exist_ok=True)
-    jar_files = list(mods_path.glob("*.jar"))
+    # scandir 返回的目录项自带文件类型，且 stat 结果会被缓存供后续复用
+    with os.scandir(mods_path) as it:
+        jar_files = [e for e in it if e.name.endswith(".jar") and e.is_file()]
     cache = load_deearth_cache()
+    records = []
     client_mods = []
+    # 在计算指纹的同时完成 TCP/TLS 握手；出现需要联网查询的模组时才发起
+    warm_up: Optional[asyncio.Task] = None
     
     with Progress(
         SpinnerColumn(), TextColumn("[progress.description]{task.description}"),
         BarColumn(), TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
         TextColumn("({task.completed}/{task.total})"), console=console
     ) as progress:
-        task = progress.add_task(f"[cyan]筛选 {len(jar_files)} 个模组", total=len(jar_files))
         semaphore = asyncio.Semaphore(config.deearth_concurrency)
-        
-        async def process_mod(mod_path: Path):
+        scan_task = progress.add_task(f"[cyan]计算 {len(jar_files)} 个模组的指纹", total=len(jar_files))
+        task = progress.add_task(f"[cyan]筛选 {len(jar_files)} 个模组", total=len(jar_files))
+
+        # 指纹计算与 API 查询组成流水线：每凑满一批指纹就立即发起查询，
+        # 其余模组的指纹计算在此期间继续进行
+        jar_queue = asyncio.Queue()
+        for jar in jar_files:
+            jar_queue.put_nowait(jar)
+        record_queue = asyncio.Queue()
+
+        async def scan_worker():
+            while not jar_queue.empty():
+                jar = jar_queue.get_nowait()
+                record = await scan_mod(jar, cache)
+                progress.update(scan_task, advance=1)
+                await record_queue.put(record)
+
+        async def close_record_queue(workers: List[asyncio.Task]):
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                await record_queue.put(None)
+
+        # 查询结果在各批次间共享，内容相同的 jar 与同一模组的不同版本只需查询一次
+        mr_verdicts = {}
+        cf_matches = {}
+        deearth_results = {}
+
+        async def process_mod(record: Dict[str, Any]):
             async with semaphore:
-                result = await deearth(mod_path, rubbish_path, cache)
+                result = await deearth(record, rubbish_path, mr_verdicts, cf_matches, deearth_results)
                 progress.update(task, advance=1)
                 return result
-        
-        results = await asyncio.gather(*[process_mod(jar) for jar in jar_files])
-        client_mods = [r for r in results if r]
-        
-    save_deearth_cache(cache)
+
+        async def process_batch(batch: List[Dict[str, Any]]):
+            # 整批都已有结论（缓存命中、已知模组等）时无需联网查询
+            if any(not record['entry']['status'] for record in batch):
+                # 预热只是优化，最多等待片刻，避免某个主机无响应时拖慢所有查询
+                await asyncio.wait([warm_up], timeout=WARM_UP_TIMEOUT)
+                await _lookup_fingerprints(batch, mr_verdicts, cf_matches)
+            return await asyncio.gather(*[process_mod(record) for record in batch])
+
+        scan_workers = [asyncio.create_task(scan_worker()) for _ in range(min(4, os.cpu_count() or 1))]
+        closer = asyncio.create_task(close_record_queue(scan_workers))
+
+        batch_tasks = []
+        batch = []
+        while (record := await record_queue.get()) is not None:
+            records.append(record)
+            if warm_up is None and not record['entry']['status']:
+                warm_up = asyncio.create_task(_warm_up_connections())
+            batch.append(record)
+            if len(batch) >= API_BATCH_SIZE:
+                batch_tasks.append(asyncio.create_task(process_batch(batch)))
+                batch = []
+        if batch:
+            batch_tasks.append(asyncio.create_task(process_batch(batch)))
+        await closer
+
+        for results in await asyncio.gather(*batch_tasks):
+            client_mods.extend(r for r in results if r)
+
+    # 预热请求可能仍卡在无响应的主机上，结束前取消
+    if warm_up is not None:
+        warm_up.cancel()
+        await asyncio.gather(warm_up, return_exceptions=True)
+
+    # 没有任何条目被新建或改写时跳过写盘
+    if any(r['dirty'] for r in records):
+        save_deearth_cache(cache)
     
     if client_mods:
         log.info(f"已移除 {len(client_mods)} 个客户端模组")
     else:
-        log.info("未检测到客户端专用模组")
\ No newline at end of file
+        log.info("未检测到客户端专用模组")
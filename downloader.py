@@ -1,4 +1,6 @@
 import asyncio
+import math
+import random
 from pathlib import Path
 from typing import List, Optional, Tuple
 
@@ -10,43 +12,107 @@ from rich.progress import (
 
 from utils.logger import log, console
 from config import config
+from constants import CF_MIRROR_URL, MR_MIRROR_URL
 from utils.exceptions import DownloaderError
 
 # --- 异步 HTTP 客户端 ---
-async_client = httpx.AsyncClient(
-    headers={"User-Agent": "DeEarthX", "x-api-key": config.CURSEFORGE_API_KEY},
-    follow_redirects=True,
-    timeout=60.0,
-)
+_async_client: Optional[httpx.AsyncClient] = None
+
+def get_async_client() -> httpx.AsyncClient:
+    """首次使用时才创建共享的异步 HTTP 客户端"""
+    global _async_client
+    if _async_client is None:
+        # 启用 HTTP/2，同一主机的大量 API 请求可复用一条 TLS 连接。
+        # 不显式传入 transport，否则 httpx 会忽略 HTTP(S)_PROXY/ALL_PROXY 环境变量；
+        # 连接失败由调用方的重试逻辑处理
+        _async_client = httpx.AsyncClient(
+            http2=True,
+            headers={"User-Agent": "DeEarthX", "x-api-key": config.CURSEFORGE_API_KEY},
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60),
+            timeout=httpx.Timeout(connect=10.0, read=30.0, write=30.0, pool=5.0),
+        )
+    return _async_client
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+# 每次从响应流读取的块大小
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+# 累积到该字节数才刷新一次进度条，减少 Rich 的锁竞争与重绘
+PROGRESS_UPDATE_BYTES = 512 * 1024
+# 累积到该字节数才交给线程池写盘，避免磁盘阻塞事件循环
+WRITE_BATCH_BYTES = 4 * 1024 * 1024
+
+# Retry-After 的等待上限（秒），避免服务器要求的超长等待卡住整个下载
+MAX_RETRY_AFTER = 60.0
+
+def _get_retry_after(response: httpx.Response) -> float:
+    """读取 Retry-After 头（秒数形式），缺失或无法解析时返回 0，超过上限时按上限处理"""
+    try:
+        delay = float(response.headers.get('Retry-After', 0))
+    except ValueError:
+        return 0.0
+    if math.isnan(delay):
+        return 0.0
+    return min(max(delay, 0.0), MAX_RETRY_AFTER)
 
 # --- 核心下载逻辑 ---
-async def fast_download(download_data: List[Tuple[str, Path, Optional[int]]], desc: str):
-    """优化的下载函数，使用 Rich Progress，最多显示指定数量的并发下载"""
+async def fast_download(download_data: List[Tuple[str, Path, Optional[int]]], desc: str, create_dirs: bool = True):
+    """优化的下载函数，使用 Rich Progress，最多显示指定数量的并发下载。
+    调用方已预先创建好目标目录时可传入 create_dirs=False，跳过逐文件的 mkdir。"""
 
     async def download_worker(url: str, dest: Path, total_size: Optional[int], progress: Progress, task_id):
         retries = config.download_retries
         for attempt in range(retries):
+            retry_after = 0.0
             try:
-                dest.parent.mkdir(parents=True, exist_ok=True)
-                async with async_client.stream("GET", url) as response:
+                if create_dirs:
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                # 已知大小且本地文件不完整时，从断点处继续下载
+                offset = dest.stat().st_size if total_size and dest.exists() else 0
+                headers = {"Range": f"bytes={offset}-"} if 0 < offset < total_size else None
+                async with get_async_client().stream("GET", url, headers=headers) as response:
                     response.raise_for_status()
-                    total = int(response.headers.get('content-length', 0)) if total_size is None or total_size == 0 else total_size
-                    progress.update(task_id, total=total)
+                    if response.status_code != 206:
+                        offset = 0
+                    total = offset + int(response.headers.get('content-length', 0)) if total_size is None or total_size == 0 else total_size
+                    progress.update(task_id, total=total, completed=offset)
                     progress.start_task(task_id)
 
-                    with dest.open("wb") as f:
-                        async for chunk in response.aiter_bytes(chunk_size=65536):
-                            f.write(chunk)
-                            progress.update(task_id, advance=len(chunk))
+                    loop = asyncio.get_running_loop()
+                    with dest.open("ab" if offset else "wb") as f:
+                        pending = 0
+                        buffer = bytearray()
+                        async for chunk in response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            buffer += chunk
+                            if len(buffer) >= WRITE_BATCH_BYTES:
+                                await loop.run_in_executor(None, f.write, buffer)
+                                buffer.clear()
+                            pending += len(chunk)
+                            if pending >= PROGRESS_UPDATE_BYTES:
+                                progress.update(task_id, advance=pending)
+                                pending = 0
+                        if buffer:
+                            await loop.run_in_executor(None, f.write, buffer)
+                        if pending:
+                            progress.update(task_id, advance=pending)
                 return # 成功下载
             except httpx.HTTPStatusError as e:
+                if e.response.status_code == 416:
+                    # 断点无效（本地文件与远端不一致），下次重试完整下载
+                    dest.unlink(missing_ok=True)
                 # 镜像源回退逻辑
-                if config.use_mirror and (url.startswith(config.CF_MIRROR_URL) or url.startswith(config.MR_MIRROR_URL)):
+                if config.use_mirror and (url.startswith(CF_MIRROR_URL) or url.startswith(MR_MIRROR_URL)):
+                    # 两个镜像共用同一域名，按路径区分：Modrinth 为 /data/，CurseForge 为 /files/
                     official_url = ""
-                    if url.startswith(config.MR_MIRROR_URL):
-                        official_url = url.replace(config.MR_MIRROR_URL, "https://cdn.modrinth.com")
-                    elif url.startswith(config.CF_MIRROR_URL + "/curseforge"):
-                        official_url = url.replace(config.CF_MIRROR_URL, "https://edge.forgecdn.net")
+                    if url.startswith(MR_MIRROR_URL + "/data/"):
+                        official_url = url.replace(MR_MIRROR_URL, "https://cdn.modrinth.com", 1)
+                    elif url.startswith(CF_MIRROR_URL + "/files/"):
+                        official_url = url.replace(CF_MIRROR_URL, "https://edge.forgecdn.net", 1)
                     
                     if official_url:
                         log.warning(f"镜像下载失败，正在尝试官方源: {dest.name}")
@@ -54,23 +120,39 @@ async def fast_download(download_data: List[Tuple[str, Path, Optional[int]]], de
                         url = official_url # 下一次重试将使用官方源
                         continue # 继续重试循环
 
+                retry_after = _get_retry_after(e.response)
                 log.warning(f"下载失败 (尝试 {attempt + 1}/{retries}): {dest.name} (状态码: {e.response.status_code})")
             except Exception as e:
                 log.warning(f"下载失败 (尝试 {attempt + 1}/{retries}): {dest.name} ({str(e)[:50]})")
             
             if attempt < retries - 1:
-                wait_time = 2 ** attempt  # 指数退避
+                # 带随机抖动的指数退避，避免大量任务同时重试；服务器给出 Retry-After 时以其为下限
+                wait_time = max(retry_after, random.uniform(0.5, 1.5) * 2 ** attempt)
                 progress.update(task_id, description=f"[yellow]重试中 ({attempt + 2}/{retries}): {dest.name}")
                 await asyncio.sleep(wait_time)
                 progress.reset(task_id)
         
         progress.update(task_id, description=f"[red]最终失败: {dest.name}")
 
+    async def is_downloaded(url: str, dest: Path, size: Optional[int]) -> bool:
+        """判断目标文件是否已完整下载，残缺文件不能仅凭存在与否跳过"""
+        if not dest.exists():
+            return False
+        local_size = dest.stat().st_size
+        if size:
+            return local_size == size
+        # 清单未提供大小时，通过 HEAD 请求比对远端长度
+        try:
+            response = await get_async_client().head(url)
+            remote_size = int(response.headers.get('content-length', -1)) if response.is_success else -1
+        except Exception:
+            return True
+        return remote_size < 0 or remote_size == local_size
+
     if not download_data:
         return
 
-    semaphore = asyncio.Semaphore(config.download_concurrency)
-    worker_count = min(config.display_concurrency, len(download_data))
+    worker_count = min(config.download_concurrency, len(download_data))
 
     with Progress(
         TextColumn("[progress.description]{task.description}"),
@@ -81,40 +163,39 @@ async def fast_download(download_data: List[Tuple[str, Path, Optional[int]]], de
     ) as progress:
         main_task = progress.add_task(f"[cyan]{desc}", total=len(download_data))
 
-        worker_queue = asyncio.Queue()
-        for i in range(worker_count):
-            worker_queue.put_nowait(progress.add_task(f"worker_{i}", visible=False))
+        # 固定数量的下载协程依次从同一迭代器取任务，而不是一次性为所有文件创建协程；
+        # 每个协程独占一个进度条，只显示前 display_concurrency 个
+        pending_downloads = iter(download_data)
 
-        async def safe_download(url: str, dest: Path, size: Optional[int]):
-            task_id = None
-            try:
-                async with semaphore:
-                    task_id = await worker_queue.get()
-                    progress.update(task_id, description=f"{dest.name}", total=size or 0, completed=0, visible=True)
+        async def download_loop(index: int):
+            task_id = progress.add_task(f"worker_{index}", visible=False)
+            visible = index < config.display_concurrency
+            for url, dest, size in pending_downloads:
+                try:
+                    progress.update(task_id, description=f"{dest.name}", total=size or 0, completed=0, visible=visible)
 
-                    if not dest.exists():
+                    if not await is_downloaded(url, dest, size):
                         await download_worker(url, dest, size, progress, task_id)
                     else:
                         progress.update(task_id, completed=size or 0, total=size or 0)
-                    
+
                     progress.update(main_task, advance=1)
-            except Exception as e:
-                log.error(f"下载任务 '{dest.name}' 出错: {e}")
-            finally:
-                if task_id is not None:
-                    await asyncio.sleep(0.2)
-                    progress.update(task_id, visible=False)
-                    worker_queue.put_nowait(task_id)
+                except Exception as e:
+                    log.error(f"下载任务 '{dest.name}' 出错: {e}")
+            progress.update(task_id, visible=False)
 
-        tasks = [safe_download(url, path, size) for url, path, size in download_data]
-        await asyncio.gather(*tasks)
+        await asyncio.gather(*[download_loop(i) for i in range(worker_count)])
 
 async def x_fast_download(url: str, dest: Path):
     if not dest.exists():
         try:
-            response = await async_client.get(url)
+            response = await get_async_client().get(url)
             response.raise_for_status()
             dest.parent.mkdir(parents=True, exist_ok=True)
-            dest.write_bytes(response.content)
+            # 整块内容直接写入，无需 BufferedWriter 额外拷贝；循环处理可能的短写
+            with dest.open("wb", buffering=0) as f:
+                view = memoryview(response.content)
+                while view:
+                    view = view[f.write(view):]
         except Exception as e:
             raise DownloaderError(f"下载失败 {dest.name}: {e}") from e
\ No newline at end of file
@@ -1,45 +1,75 @@
 import asyncio
-import json
+import os
 import shutil
 import sys
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import List
 
 import questionary
 
 from config import config
+from constants import reset_api_urls
 from deearth import deearth_main
-from downloader import async_client
+from downloader import close_async_client
 from platforms import get_platform
 from server_installer import install_server, create_launch_scripts
 from utils.logger import log, console
 from utils.exceptions import DeEarthError
+from utils.json_utils import json_loads
+
+# 解压 overrides 时每次拷贝的块大小
+EXTRACT_CHUNK_SIZE = 128 * 1024
+# 目标文件写缓冲，减少 write 系统调用次数
+EXTRACT_WRITE_BUFFER = 1 << 20
 
 def cleanup(path: Path):
     """删除不需要的文件和目录"""
     log.info("清理临时文件...")
-    items_to_remove = [
+    items_to_remove = {
         "installer.log", "installer.jar", "fabric-installer.jar",
         "forge-installer.jar", "neoforge-installer.jar",
         "options.txt",
-    ]
-    dirs_to_remove = ["shaderpacks", "resourcepacks", "essential"]
-
-    for item in items_to_remove:
-        item_path = path / item
-        try:
-            if item_path.is_file() or item_path.is_symlink():
-                item_path.unlink()
-        except Exception:
-            pass
+    }
+    dirs_to_remove = {"shaderpacks", "resourcepacks", "essential"}
+
+    # 一次目录扫描完成分类，避免逐项 stat
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.name in items_to_remove and not entry.is_dir(follow_symlinks=False):
+                    os.unlink(entry.path)
+                elif entry.name in dirs_to_remove and entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except Exception:
+                pass
+
+
+def extract_overrides(modpack_path: Path, names: List[str], instance_dir: Path):
+    """多线程解压 overrides 目录，zlib 解压时会释放 GIL"""
+    # ZipFile 对象不能在线程间共享读取位置，每个线程单独打开一份
+    local = threading.local()
+    handles = []
+
+    def extract(name: str):
+        zf = getattr(local, 'zf', None)
+        if zf is None:
+            zf = local.zf = zipfile.ZipFile(modpack_path, 'r')
+            handles.append(zf)
+        target_path = instance_dir / name[len("overrides/"):]
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        # 分块流式解压，避免大文件整体读入内存
+        with zf.open(name) as src, target_path.open('wb', buffering=EXTRACT_WRITE_BUFFER) as dst:
+            shutil.copyfileobj(src, dst, length=EXTRACT_CHUNK_SIZE)
 
-    for item in dirs_to_remove:
-        item_path = path / item
-        try:
-            if item_path.is_dir():
-                shutil.rmtree(item_path, ignore_errors=True)
-        except Exception:
-            pass
+    try:
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(extract, names))
+    finally:
+        for zf in handles:
+            zf.close()
 
 
 async def main_logic(modpack_path_str: str):
@@ -55,6 +85,7 @@ async def main_logic(modpack_path_str: str):
     log.info(f"正在解压整合包到: {instance_dir}")
 
     dud_files = []
+    override_names = []
     pack_info = {}
 
     try:
@@ -64,13 +95,11 @@ async def main_logic(modpack_path_str: str):
                     continue
                 name = member.filename
                 if name.startswith("overrides/"):
-                    target_path = instance_dir / name[len("overrides/"):]
-                    target_path.parent.mkdir(parents=True, exist_ok=True)
-                    target_path.write_bytes(zf.read(name))
+                    override_names.append(name)
                 elif name.endswith((".json", "mcbbs.packmeta")):
                     dud_files.append(name)
                     if name in ["modrinth.index.json", "manifest.json"]:
-                        pack_info = json.loads(zf.read(name).decode('utf-8'))
+                        pack_info = json_loads(zf.read(name))
     except zipfile.BadZipFile:
         log.error("文件不是有效的 ZIP 压缩包")
         return
@@ -78,14 +107,28 @@ async def main_logic(modpack_path_str: str):
         log.error(f"解压整合包时发生错误: {e}")
         return
 
-    log.info("解压完成")
-
     platform = get_platform(dud_files)
     if not platform:
         log.error("无法识别的整合包平台，仅支持 CurseForge 和 Modrinth")
         return
 
     platform.validate_pack_info(pack_info)
+
+    # 元数据请求只依赖清单文件，与解压并行进行
+    meta_task = asyncio.create_task(platform.prefetch_meta(pack_info))
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            None, extract_overrides, modpack_path, override_names, instance_dir
+        )
+    except Exception as e:
+        meta_task.cancel()
+        await asyncio.gather(meta_task, return_exceptions=True)
+        log.error(f"解压整合包时发生错误: {e}")
+        return
+
+    log.info("解压完成")
+    await meta_task
+
     info = await platform.get_info(pack_info)
     log.info(f"整合包信息: MC {info['minecraft']}, 加载器 {info['loader']}@{info['loader_version']}")
 
@@ -119,7 +162,7 @@ async def cli_main():
     except Exception:
         answer = input("是否优先使用镜像源 (推荐)? (Y/n) ")
         config.use_mirror = not answer.lower().startswith('n')
-
+    reset_api_urls()
 
     modpack_path = None
     if len(sys.argv) > 1:
@@ -140,7 +183,7 @@ async def cli_main():
     else:
         log.info("操作已取消")
 
-    await async_client.aclose()
+    await close_async_client()
 
 
 def init_dir():
@@ -149,9 +192,18 @@ def init_dir():
         (config.unzip_path / ".rubbish").mkdir(parents=True, exist_ok=True)
 
 
+def run_event_loop(main):
+    """uvloop 为可选加速依赖（不支持 Windows），可用时替换默认事件循环"""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(main)
+    return uvloop.run(main)
+
+
 if __name__ == "__main__":
     try:
-        asyncio.run(cli_main())
+        run_event_loop(cli_main())
     except KeyboardInterrupt:
         log.info("\n操作被用户中断")
     except DeEarthError as e:
@@ -10,6 +10,10 @@ class BasePlatform(abc.ABC):
         """从整合包信息中提取 Minecraft 版本和加载器信息。"""
         ...
 
+    async def prefetch_meta(self, pack_info: Dict[str, Any]):
+        """预取下载所需的元数据，可与解压并行执行。默认无需预取。"""
+        return None
+
     @abc.abstractmethod
     async def download_files(self, pack_info: Dict[str, Any], path: Path):
         """根据整合包信息下载所有模组文件。"""
@@ -1,21 +1,45 @@
+import asyncio
+import random
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import httpx
 
 from .base import BasePlatform
-from downloader import fast_download, async_client
+from downloader import fast_download, get_async_client
 from utils.logger import log # <--- 新增导入
 from config import config
-from constants import get_cf_api_url
+from constants import CF_MIRROR_URL, get_cf_api_url
 from utils.exceptions import PlatformError
+from utils.url_utils import url_path
+from utils.json_utils import json_loads
+
+# 单次请求携带的 fileId 数量与并发请求数
+FILE_IDS_CHUNK_SIZE = 200
+FILE_META_CONCURRENCY = 8
+
+def _file_url(file_info: Dict[str, Any], use_mirror: bool) -> str:
+    url = file_info.get('downloadUrl')
+    if not url:
+        # 部分模组禁止第三方分发，downloadUrl 为空，按 CDN 规则拼接: files/<id 前几位>/<id 后三位>/
+        id_high, id_low = divmod(file_info['id'], 1000)
+        url = f"https://edge.forgecdn.net/files/{id_high}/{id_low}/{file_info['fileName']}"
+    return CF_MIRROR_URL + url_path(url) if use_mirror else url
 
 class CurseForge(BasePlatform):
     def validate_pack_info(self, pack_info: Dict[str, Any]):
         """验证 CurseForge 整合包信息。"""
         super().validate_pack_info(pack_info)
-        if 'minecraft' not in pack_info or 'version' not in pack_info.get('minecraft', {}) or 'modLoaders' not in pack_info.get('minecraft', {}):
+        minecraft = pack_info.get('minecraft')
+        if not isinstance(minecraft, dict) or 'version' not in minecraft or 'modLoaders' not in minecraft:
             raise PlatformError("CurseForge manifest.json 格式无效：缺少 'minecraft', 'version', 或 'modLoaders' 键。")
+        mod_loaders = minecraft['modLoaders']
+        if not isinstance(mod_loaders, list) or not mod_loaders or not isinstance(mod_loaders[0], dict) or 'id' not in mod_loaders[0]:
+            raise PlatformError("CurseForge manifest.json 格式无效：'modLoaders' 为空或缺少 'id'。")
+        # 一次遍历校验所有文件条目，避免下载阶段才因缺键报错
+        files = pack_info.get('files')
+        if not isinstance(files, list) or not all(isinstance(file, dict) and 'fileID' in file for file in files):
+            raise PlatformError("CurseForge manifest.json 格式无效：'files' 缺失或条目缺少 'fileID'。")
 
     async def get_info(self, pack_info: Dict[str, Any]) -> Dict[str, str]:
         info = {'minecraft': pack_info['minecraft']['version'], 'loader': 'unknown', 'loader_version': 'unknown'}
@@ -25,30 +49,56 @@ class CurseForge(BasePlatform):
             info['loader'], info['loader_version'] = parts
         return info
 
-    async def download_files(self, pack_info: Dict[str, Any], path: Path):
-        log.info("从 CurseForge 下载模组...")
+    async def _fetch_files_chunk(self, file_ids: List[int], semaphore: asyncio.Semaphore) -> List[Dict[str, Any]]:
+        """请求一批 fileId 的信息，网络错误和 429/5xx 时退避重试"""
+        retries = config.download_retries
+        async with semaphore:
+            for attempt in range(retries):
+                try:
+                    response = await get_async_client().post(
+                        f"{get_cf_api_url()}/v1/mods/files",
+                        json={"fileIds": file_ids},
+                        headers={"x-api-key": config.CURSEFORGE_API_KEY}
+                    )
+                    response.raise_for_status()
+                    return json_loads(response.content).get('data', [])
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 429 and e.response.status_code < 500 or attempt == retries - 1:
+                        raise
+                except httpx.TransportError:
+                    if attempt == retries - 1:
+                        raise
+                log.warning(f"获取 CurseForge 文件信息失败 (尝试 {attempt + 1}/{retries})，正在重试...")
+                await asyncio.sleep(random.uniform(0.5, 1.5) * 2 ** attempt)
+
+    async def prefetch_meta(self, pack_info: Dict[str, Any]):
+        """提前请求模组文件信息，结果供 download_files 使用"""
         file_ids = [file['fileID'] for file in pack_info['files']]
+        semaphore = asyncio.Semaphore(FILE_META_CONCURRENCY)
 
-        response = await async_client.post(
-            f"{get_cf_api_url()}/v1/mods/files",
-            json={"fileIds": file_ids},
-            headers={"x-api-key": config.CURSEFORGE_API_KEY}
-        )
-        response.raise_for_status()
+        # 分批并发请求，单批失败只重试该批
+        results = await asyncio.gather(*(
+            self._fetch_files_chunk(file_ids[i:i + FILE_IDS_CHUNK_SIZE], semaphore)
+            for i in range(0, len(file_ids), FILE_IDS_CHUNK_SIZE)
+        ))
 
-        files_data = response.json().get('data', [])
-        download_tasks = []
+        self._files_data = [file_info for chunk in results for file_info in chunk]
+        return self._files_data
 
-        for file_info in files_data:
-            if not file_info['fileName'].endswith(".zip"):
-                url = file_info.get('downloadUrl')
-                if not url:
-                    url = f"https://edge.forgecdn.net/files/{file_info['id'] // 1000}/{file_info['id'] % 1000}/{file_info['fileName']}"
+    async def download_files(self, pack_info: Dict[str, Any], path: Path):
+        log.info("从 CurseForge 下载模组...")
+        files_data = getattr(self, '_files_data', None)
+        if files_data is None:
+            files_data = await self.prefetch_meta(pack_info)
 
-                if config.use_mirror:
-                    url = "https://mod.mcimirror.top" + httpx.URL(url).path
+        use_mirror = config.use_mirror
+        mods_dir = path / "mods"
 
-                dest = path / "mods" / file_info['fileName']
-                download_tasks.append((url, dest, file_info.get('fileLength')))
+        # 整合包中的 zip（资源包等）不需要下载，大小写不敏感
+        download_tasks = [
+            (_file_url(file_info, use_mirror), mods_dir / file_info['fileName'], file_info.get('fileLength'))
+            for file_info in files_data
+            if not file_info['fileName'].lower().endswith(".zip")
+        ]
 
         await fast_download(download_tasks, "下载 CurseForge 模组")
\ No newline at end of file
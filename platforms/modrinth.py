@@ -1,14 +1,13 @@
 from pathlib import Path
 from typing import Any, Dict
 
-import httpx
-
 from .base import BasePlatform
 from downloader import fast_download
 from utils.logger import log # <--- 新增导入
 from config import config
-from constants import get_mr_api_url
+from constants import MR_MIRROR_URL, get_mr_api_url
 from utils.exceptions import PlatformError
+from utils.url_utils import url_path
 
 class Modrinth(BasePlatform):
     def validate_pack_info(self, pack_info: Dict[str, Any]):
@@ -16,6 +15,12 @@ class Modrinth(BasePlatform):
         super().validate_pack_info(pack_info)
         if 'dependencies' not in pack_info or not isinstance(pack_info.get('dependencies'), dict):
             raise PlatformError("Modrinth modrinth.index.json 格式无效：缺少 'dependencies' 键。")
+        # 一次遍历校验所有文件条目，避免下载阶段才因缺键报错
+        files = pack_info.get('files')
+        if not isinstance(files, list) or not all(
+            isinstance(file, dict) and 'path' in file and file.get('downloads') for file in files
+        ):
+            raise PlatformError("Modrinth modrinth.index.json 格式无效：'files' 缺失或条目缺少 'path'/'downloads'。")
 
     async def get_info(self, pack_info: Dict[str, Any]) -> Dict[str, str]:
         deps = pack_info['dependencies']
@@ -30,14 +35,17 @@ class Modrinth(BasePlatform):
 
     async def download_files(self, pack_info: Dict[str, Any], path: Path):
         log.info("从 Modrinth 下载模组...")
-        download_tasks = []
+        use_mirror = config.use_mirror
 
-        for file_info in pack_info['files']:
-            if not file_info['path'].endswith(".zip"):
-                url = file_info['downloads'][0]
-                if config.use_mirror:
-                    url = "https://mod.mcimirror.top" + httpx.URL(url).path
-                dest = path / Path(file_info['path'])
-                download_tasks.append((url, dest, file_info.get('fileSize')))
+        # 整合包中的 zip（资源包等）不需要下载，大小写不敏感
+        download_tasks = [
+            (
+                MR_MIRROR_URL + url_path(file_info['downloads'][0]) if use_mirror else file_info['downloads'][0],
+                path / file_info['path'],
+                file_info.get('fileSize'),
+            )
+            for file_info in pack_info['files']
+            if not file_info['path'].lower().endswith(".zip")
+        ]
 
         await fast_download(download_tasks, "下载 Modrinth 模组")
\ No newline at end of file
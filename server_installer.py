@@ -1,17 +1,34 @@
-import json
+import asyncio
+import hashlib
+import os
 import re
 import subprocess
 import sys
+import time
 import zipfile
 from pathlib import Path
-
-import httpx
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from utils.logger import log
-from downloader import fast_download, x_fast_download, async_client
+from downloader import fast_download, x_fast_download, get_async_client
 from config import config
-from constants import BMCLAPI_URL # <--- 修正：直接从 constants 导入
+from constants import BMCLAPI_URL, BMCLAPI_MAVEN_URL # <--- 修正：直接从 constants 导入
 from utils.exceptions import PackInstallError
+from utils.json_utils import json_loads, json_dumps
+from utils.url_utils import url_path
+
+def _write_executable(script_path: Path, content: str):
+    """以可执行权限写入脚本，权限在打开文件时设置，无需额外 stat"""
+    fd = os.open(script_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o755)
+    try:
+        # 创建时的权限参数对已存在的文件（如来自 overrides）无效，需要补上
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, 0o755)
+        data = memoryview(content.encode('utf-8'))
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
 
 def create_launch_scripts(path: Path, server_type: str, mc_version: str, loader_version: str):
     log.info("创建启动脚本...")
@@ -28,12 +45,7 @@ def create_launch_scripts(path: Path, server_type: str, mc_version: str, loader_
         )
 
         # Linux/macOS wrapper script
-        start_sh = path / "start.sh"
-        start_sh.write_text(
-            "#!/bin/bash\n"
-            "./run.sh"
-        )
-        start_sh.chmod(start_sh.stat().st_mode | 0o111)
+        _write_executable(path / "start.sh", "#!/bin/bash\n./run.sh")
 
     elif server_type in ["fabric", "fabric-loader"]:
         java_command = f'java -Xms{config.java_memory} -Xmx{config.java_memory}'
@@ -43,17 +55,116 @@ def create_launch_scripts(path: Path, server_type: str, mc_version: str, loader_
         (path / "start.bat").write_text(f"@echo off\n{command_win}\npause")
         
         command_sh = f"#!/bin/bash\n{command_win}\n"
-        start_sh = path / "start.sh"
-        start_sh.write_text(command_sh)
-        start_sh.chmod(start_sh.stat().st_mode | 0o111)
+        _write_executable(path / "start.sh", command_sh)
 
-async def install_server(server_type: str, mc_version: str, loader_version: str, path: Path):
-    java_path = "java"
+def _library_cache_path(server_type: str, mc_version: str, loader_version: str) -> Path:
+    key = hashlib.sha256(f"{mc_version}|{server_type}|{loader_version}".encode()).hexdigest()
+    return config.LIBRARY_CACHE_DIR / f"{key}.json"
+
+def _load_library_cache(cache_path: Path, path: Path) -> Optional[List[Tuple[str, Path, Optional[int]]]]:
+    """读取已解析的依赖库列表，缓存中保存的是相对 libraries 目录的路径"""
+    libraries_dir = path / "libraries"
+    try:
+        entries = json_loads(cache_path.read_bytes())
+        if not isinstance(entries, list):
+            return None
+        library_tasks = []
+        for url, rel_path, size in entries:
+            # 格式不符的缓存视为失效，回退到重新解析
+            if not isinstance(url, str) or not isinstance(rel_path, str) or not (size is None or isinstance(size, int)):
+                return None
+            library_tasks.append((url, libraries_dir / rel_path, size))
+        return library_tasks
+    except (OSError, ValueError, TypeError):
+        return None
+
+def _save_library_cache(cache_path: Path, library_tasks: List[Tuple[str, Path, Optional[int]]], path: Path):
+    libraries_dir = path / "libraries"
+    entries = [(url, dest.relative_to(libraries_dir).as_posix(), size) for url, dest, size in library_tasks]
+    # 缓存只是加速手段，写入失败（只读目录、磁盘已满等）不影响安装
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，避免写入中途被中断导致缓存损坏
+        tmp_path = cache_path.with_suffix('.tmp')
+        tmp_path.write_bytes(json_dumps(entries))
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        log.debug(f"写入依赖库缓存失败: {e}")
+
+def _to_bmclapi_maven(url: str, strip_releases: bool = False) -> str:
+    """将依赖库地址转换为 BMCLAPI maven 镜像地址；安装器中的地址可能带有仓库前缀 /releases"""
+    path = url_path(url)
+    if strip_releases:
+        path = path.replace('/releases', '', 1)
+    return BMCLAPI_MAVEN_URL + path
+
+def _make_dirs(dirs: Set[Path]):
+    for directory in dirs:
+        directory.mkdir(parents=True, exist_ok=True)
+
+def _extract_profiles(installer_path: Path) -> List[Dict[str, Any]]:
+    """读取安装器中的 version.json 和 install_profile.json"""
+    profiles = []
+    with zipfile.ZipFile(installer_path, 'r') as zf:
+        # 直接查中央目录索引，不再对 namelist() 线性扫描
+        name_to_info = zf.NameToInfo
+        for name in ["version.json", "install_profile.json"]:
+            profile_info = name_to_info.get(name)
+            if profile_info:
+                with zf.open(profile_info) as fp:
+                    profiles.append(json_loads(fp.read()))
+    return profiles
+
+async def _run_concurrently(*coros):
+    """并发执行协程，任一失败时取消其余协程并抛出该异常；3.11 以下回退到 gather"""
+    if not hasattr(asyncio, 'TaskGroup'):
+        await asyncio.gather(*coros)
+        return
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for coro in coros:
+                tg.create_task(coro)
+    except BaseExceptionGroup as eg:
+        # 沿用原有的错误处理，只抛出第一个异常
+        raise eg.exceptions[0]
+
+async def _run_command(command, cwd: Path = None, capture_output: bool = False):
+    """异步运行外部命令，失败时抛出 CalledProcessError 以沿用原有错误处理"""
+    pipe = asyncio.subprocess.PIPE if capture_output else asyncio.subprocess.DEVNULL
+    proc = await asyncio.create_subprocess_exec(
+        *command, cwd=cwd, stdout=pipe, stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, command, output=stdout, stderr=stderr)
+    return stdout, stderr
 
+# Java 检测结果的有效期，期间不再启动 JVM 检测版本
+JAVA_CHECK_TTL = 24 * 60 * 60
+
+def _java_check_is_fresh() -> bool:
     try:
-        subprocess.run([java_path, "-version"], check=True, capture_output=True, text=True)
+        return time.time() - config.JAVA_CHECK_MARKER.stat().st_mtime < JAVA_CHECK_TTL
+    except OSError:
+        return False
+
+async def _check_java(java_path: str):
+    """检测 Java 是否可用，成功后写入标记文件，有效期内跳过检测"""
+    if _java_check_is_fresh():
+        return
+    try:
+        await _run_command([java_path, "-version"], capture_output=True)
     except (subprocess.CalledProcessError, FileNotFoundError):
         raise PackInstallError("未找到 Java，请确保已安装 Java 并添加到 PATH")
+    try:
+        config.JAVA_CHECK_MARKER.parent.mkdir(parents=True, exist_ok=True)
+        config.JAVA_CHECK_MARKER.touch()
+    except OSError:
+        pass
+
+async def install_server(server_type: str, mc_version: str, loader_version: str, path: Path):
+    java_path = "java"
+    await _check_java(java_path)
 
     log.info(f"正在安装 {server_type} 服务端...")
 
@@ -64,7 +175,7 @@ async def install_server(server_type: str, mc_version: str, loader_version: str,
             await x_fast_download(installer_url, installer_path)
 
             command = [java_path, "-jar", str(installer_path), "server", "-mcver", mc_version, "-loader", loader_version, "-dir", str(path), "-downloadMinecraft"]
-            subprocess.run(command, check=True, cwd=path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            await _run_command(command, cwd=path)
 
         elif server_type in ["forge", "neoforge"]:
             if server_type == "forge":
@@ -74,41 +185,70 @@ async def install_server(server_type: str, mc_version: str, loader_version: str,
                 installer_url = f"{BMCLAPI_URL}/neoforge/version/{loader_version}/download/installer.jar" # <--- 修正
                 installer_path = path / "neoforge-installer.jar"
 
+            cache_path = _library_cache_path(server_type, mc_version, loader_version)
+            library_tasks = _load_library_cache(cache_path, path)
+            mc_info_task = None
+            if library_tasks is None:
+                # 原版版本信息与安装器下载互不依赖，并行请求
+                mc_info_url = f"{BMCLAPI_URL}/version/{mc_version}/json" # <--- 修正
+                mc_info_task = asyncio.create_task(get_async_client().get(mc_info_url))
+
             log.info(f"下载 {server_type} 安装器...")
-            await x_fast_download(installer_url, installer_path)
+            try:
+                await x_fast_download(installer_url, installer_path)
+            except Exception:
+                if mc_info_task is not None:
+                    mc_info_task.cancel()
+                    await asyncio.gather(mc_info_task, return_exceptions=True)
+                raise
 
-            log.info(f"解析 {server_type} 依赖库...")
-            library_tasks = []
-            with zipfile.ZipFile(installer_path, 'r') as zf:
-                mc_info_url = f"{BMCLAPI_URL}/version/{mc_version}/json" # <--- 修正
-                mc_info = (await async_client.get(mc_info_url)).json()
+            if library_tasks is None:
+                log.info(f"解析 {server_type} 依赖库...")
+                # 原版与安装器的依赖库大量重叠，按目标路径去重
+                tasks_by_dest: Dict[Path, Tuple[str, Path, Optional[int]]] = {}
+                # 解析安装器 JAR 放到线程中，与版本信息请求同时进行
+                try:
+                    profiles = await asyncio.to_thread(_extract_profiles, installer_path)
+                except Exception:
+                    mc_info_task.cancel()
+                    await asyncio.gather(mc_info_task, return_exceptions=True)
+                    raise
+                mc_info_response = await mc_info_task
+                mc_info_response.raise_for_status()
+                mc_info = json_loads(mc_info_response.content)
                 for lib in mc_info.get('libraries', []):
                     artifact = lib.get('downloads', {}).get('artifact')
                     if artifact:
-                        lib_url = f"https://bmclapi2.bangbang93.com/maven{httpx.URL(artifact['url']).path}"
+                        lib_url = _to_bmclapi_maven(artifact['url'])
                         lib_dest = path / "libraries" / artifact['path']
-                        library_tasks.append((lib_url, lib_dest, artifact.get('size')))
-
-                for name in ["version.json", "install_profile.json"]:
-                    if name in zf.namelist():
-                        profile = json.loads(zf.read(name))
-                        for lib in profile.get('libraries', []):
-                            artifact = lib.get('downloads', {}).get('artifact')
-                            if artifact:
-                                lib_url = f"https://bmclapi2.bangbang93.com/maven{httpx.URL(artifact['url']).path.replace('/releases', '')}"
-                                lib_dest = path / "libraries" / artifact['path']
-                                library_tasks.append((lib_url, lib_dest, artifact.get('size')))
+                        tasks_by_dest.setdefault(lib_dest, (lib_url, lib_dest, artifact.get('size')))
 
-            await fast_download(library_tasks, f"下载 {server_type} 依赖库")
+                for profile in profiles:
+                    for lib in profile.get('libraries', []):
+                        artifact = lib.get('downloads', {}).get('artifact')
+                        if artifact:
+                            lib_url = _to_bmclapi_maven(artifact['url'], strip_releases=True)
+                            lib_dest = path / "libraries" / artifact['path']
+                            tasks_by_dest.setdefault(lib_dest, (lib_url, lib_dest, artifact.get('size')))
+                library_tasks = list(tasks_by_dest.values())
+                # 版本信息不完整时不写缓存，避免之后每次安装都沿用缺失原版依赖库的列表
+                if mc_info.get('libraries'):
+                    _save_library_cache(cache_path, library_tasks, path)
 
-            log.info("下载原版服务端 JAR...")
+            # 依赖库大多共享目录，先一次性创建所有目录，下载时不再逐文件 mkdir
+            await asyncio.to_thread(_make_dirs, {dest.parent for _, dest, _ in library_tasks})
+            log.info("下载依赖库和原版服务端 JAR...")
             server_jar_url = f"{BMCLAPI_URL}/version/{mc_version}/server" # <--- 修正
             server_jar_dest = path / "libraries" / "net" / "minecraft" / "server" / mc_version / f"server-{mc_version}.jar"
-            await x_fast_download(server_jar_url, server_jar_dest)
+            # 两者互不依赖，同时下载，共用同一连接池
+            await _run_concurrently(
+                fast_download(library_tasks, f"下载 {server_type} 依赖库", create_dirs=False),
+                x_fast_download(server_jar_url, server_jar_dest),
+            )
 
             log.info(f"运行 {server_type} 安装程序...")
             command = [java_path, "-jar", str(installer_path), "--installServer"]
-            subprocess.run(command, check=True, cwd=path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            await _run_command(command, cwd=path)
 
         log.info(f"{server_type.capitalize()} 服务端安装完成")
 
@@ -0,0 +1,19 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选加速依赖，缺失时回退到标准库
+    orjson = None
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """解析 JSON，orjson 可直接处理 bytes，省去一次 UTF-8 解码。"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """序列化为 UTF-8 编码的 JSON。"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
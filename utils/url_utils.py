@@ -0,0 +1,6 @@
+def url_path(url: str) -> str:
+    """提取 URL 的路径部分（不含查询参数和片段），比构造 httpx.URL 轻量得多。"""
+    rest = url.split('://', 1)[-1]
+    rest = rest.partition('?')[0].partition('#')[0]
+    slash = rest.find('/')
+    return rest[slash:] if slash >= 0 else '/'